@@ -0,0 +1,339 @@
+import hashlib
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Local stand-ins for the GEO FTP server and the Azure OpenAI chat-completion and
+# embedding endpoints, so benchmarks run without network access or API keys. Both
+# servers listen on 127.0.0.1 with an OS-assigned port and run in a daemon thread.
+
+
+class RateLimiter:
+    """
+    Allows at most `rate` requests per second (token bucket with a one-second burst).
+    rate=None disables limiting.
+    """
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.tokens = rate or 0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if self.rate is None:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+# --- FTP ------------------------------------------------------------------------
+
+class _FTPHandler(socketserver.StreamRequestHandler):
+    """
+    Implements the subset of FTP that ftplib uses in get_meta_gse_mostrecent.py:
+    USER, PASS, TYPE, PWD, CWD, PASV, NLST, RETR and QUIT.
+    """
+    def reply(self, line):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(f"{line}\r\n".encode('latin-1'))
+
+    def open_passive(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        port = listener.getsockname()[1]
+        self.passive = listener
+        self.reply(f"227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 0xFF})")
+
+    def send_data(self, data):
+        if self.passive is None:
+            self.reply("425 Use PASV first")
+            return
+        self.reply("150 Opening data connection")
+        conn, _ = self.passive.accept()
+        try:
+            if self.server.bytes_per_second:
+                chunk = max(1, self.server.bytes_per_second // 20)
+                for i in range(0, len(data), chunk):
+                    conn.sendall(data[i:i + chunk])
+                    time.sleep(0.05)
+            else:
+                conn.sendall(data)
+        finally:
+            conn.close()
+            self.passive.close()
+            self.passive = None
+        self.reply("226 Transfer complete")
+
+    def resolve(self, path):
+        if not path.startswith('/'):
+            path = f"{self.cwd.rstrip('/')}/{path}"
+        parts = []
+        for part in path.split('/'):
+            if part in ('', '.'):
+                continue
+            if part == '..':
+                if parts:
+                    parts.pop()
+            else:
+                parts.append(part)
+        return '/' + '/'.join(parts)
+
+    def handle(self):
+        self.cwd = '/'
+        self.passive = None
+        self.reply("220 Mock GEO FTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command, _, argument = line.decode('latin-1').strip().partition(' ')
+            command = command.upper()
+            tree = self.server.tree
+
+            if command == 'USER':
+                self.reply("331 Anonymous login ok")
+            elif command == 'PASS':
+                self.reply("230 Logged in")
+            elif command == 'TYPE':
+                self.reply("200 Type set")
+            elif command == 'PWD':
+                self.reply(f'257 "{self.cwd}"')
+            elif command == 'CWD':
+                path = self.resolve(argument)
+                if path in tree and isinstance(tree[path], list):
+                    self.cwd = path
+                    self.reply("250 Directory changed")
+                else:
+                    self.reply(f"550 {argument}: No such file or directory")
+            elif command == 'PASV':
+                self.open_passive()
+            elif command == 'NLST':
+                path = self.resolve(argument) if argument else self.cwd
+                entries = tree.get(path)
+                if not isinstance(entries, list):
+                    self.reply(f"550 {argument}: No such file or directory")
+                    continue
+                self.send_data(''.join(f"{name}\r\n" for name in entries).encode('latin-1'))
+            elif command == 'RETR':
+                path = self.resolve(argument)
+                data = tree.get(path)
+                if not isinstance(data, bytes):
+                    self.reply(f"550 {argument}: No such file")
+                    continue
+                self.send_data(data)
+            elif command == 'QUIT':
+                self.reply("221 Goodbye")
+                break
+            else:
+                self.reply(f"502 {command} not implemented")
+
+
+class MockFTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, files, latency=0.0, bytes_per_second=None):
+        """
+        files maps absolute paths (e.g. /geo/series/GSE1nnn/GSE1001/miniml/x.tgz) to
+        bytes; the directory listing is derived from them. latency is added before every
+        control-channel reply, bytes_per_second throttles downloads.
+        """
+        super().__init__(('127.0.0.1', 0), _FTPHandler)
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.tree = {'/': []}
+        for path, data in files.items():
+            self.tree[path] = data
+            parts = path.strip('/').split('/')
+            for depth in range(len(parts)):
+                parent = '/' + '/'.join(parts[:depth])
+                self.tree.setdefault(parent, [])
+                if parts[depth] not in self.tree[parent]:
+                    self.tree[parent].append(parts[depth])
+        self.port = self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+# --- Chat completions and embeddings ------------------------------------------
+
+class _OpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        path = urlsplit(self.path).path
+
+        with server.lock:
+            server.requests += 1
+        if not server.limiter.allow():
+            with server.lock:
+                server.rate_limited += 1
+            self.send_json(429, {'error': {'code': '429', 'message': 'Rate limit exceeded (mock)'}},
+                           {'Retry-After': str(server.retry_after), 'retry-after-ms': str(int(server.retry_after * 1000))})
+            return
+
+        if path.endswith('/chat/completions'):
+            time.sleep(server.chat_latency)
+            self.send_json(200, server.chat_response(request))
+        elif path.endswith('/embeddings'):
+            inputs = request.get('input', [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            time.sleep(server.embedding_latency + server.embedding_latency_per_input * len(inputs))
+            self.send_json(200, server.embedding_response(inputs))
+        else:
+            self.send_json(404, {'error': {'message': f'unknown path {path}'}})
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fields=(), chat_latency=0.0, embedding_latency=0.0, embedding_latency_per_input=0.0,
+                 rate_limit=None, retry_after=0.1, dimension=1536):
+        """
+        Answers any .../chat/completions and .../embeddings request, so it can stand in
+        for Azure OpenAI (azure_endpoint=server.url) and OpenAI-compatible APIs alike.
+        Chat answers contain a [field]...[/field] block for every name in fields.
+        rate_limit is in requests per second; excess requests get a 429.
+        """
+        super().__init__(('127.0.0.1', 0), _OpenAIHandler)
+        self.fields = list(fields)
+        self.chat_latency = chat_latency
+        self.embedding_latency = embedding_latency
+        self.embedding_latency_per_input = embedding_latency_per_input
+        self.limiter = RateLimiter(rate_limit)
+        self.retry_after = retry_after
+        self.dimension = dimension
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def chat_response(self, request):
+        prompt = ' '.join(str(message.get('content', '')) for message in request.get('messages', []))
+        content = '\n'.join(f"[{field}]synthetic {field}[/{field}]" for field in self.fields)
+        return {
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': len(prompt) // 4,
+                'completion_tokens': len(content) // 4,
+                'total_tokens': (len(prompt) + len(content)) // 4
+            }
+        }
+
+    def embedding_vector(self, text):
+        # Deterministic per input so repeated queries return identical vectors
+        rng = random.Random(hashlib.md5(text.encode('utf-8')).digest())
+        return [rng.uniform(-1, 1) for _ in range(self.dimension)]
+
+    def embedding_response(self, inputs):
+        tokens = sum(len(text) // 4 for text in inputs)
+        return {
+            'object': 'list',
+            'model': 'mock-embedding',
+            'data': [
+                {'object': 'embedding', 'index': i, 'embedding': self.embedding_vector(text)}
+                for i, text in enumerate(inputs)
+            ],
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}
+        }
+
+
+class MockIndex:
+    """
+    In-memory replacement for a Pinecone index (fetch, upsert, query) using brute-force
+    cosine similarity.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.vectors = {}
+        self.lock = threading.Lock()
+
+    def fetch(self, ids, namespace=None):
+        time.sleep(self.latency)
+        with self.lock:
+            return {'vectors': {id: self.vectors[id] for id in ids if id in self.vectors}}
+
+    def upsert(self, vectors, namespace=None):
+        time.sleep(self.latency)
+        with self.lock:
+            for vector in vectors:
+                norm = sum(v * v for v in vector['values']) ** 0.5 or 1.0
+                self.vectors[vector['id']] = {**vector, 'norm': norm}
+        return {'upserted_count': len(vectors)}
+
+    def query(self, vector, top_k=10, namespace=None, include_values=False, include_metadata=True):
+        time.sleep(self.latency)
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        with self.lock:
+            stored = list(self.vectors.values())
+        scored = sorted(
+            ((sum(a * b for a, b in zip(vector, item['values'])) / (norm * item['norm']), item) for item in stored),
+            key=lambda pair: pair[0],
+            reverse=True
+        )[:top_k]
+        return {'matches': [
+            {'id': item['id'], 'score': score, 'metadata': item['metadata'] if include_metadata else None}
+            for score, item in scored
+        ]}
+
+
+class MockPinecone:
+    def __init__(self, latency=0.0):
+        self.indexes = {}
+        self.latency = latency
+
+    def list_indexes(self):
+        return [{'name': name} for name in self.indexes]
+
+    def create_index(self, name, **kwargs):
+        self.Index(name)
+
+    def describe_index(self, name):
+        return type('IndexDescription', (), {'status': {'ready': True}})()
+
+    def Index(self, name):
+        return self.indexes.setdefault(name, MockIndex(self.latency))
@@ -0,0 +1,429 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import synthetic
+from benchmarks.mock_servers import MockFTPServer, MockOpenAIServer, MockPinecone
+from search_service import LatencyTracker
+
+# Offline throughput benchmarks for the GEO pipeline.
+#
+#   python -m benchmarks.run                      # default profile, compare with baseline
+#   python -m benchmarks.run --profile huge       # includes a 20k-sample SuperSeries
+#   python -m benchmarks.run --save-baseline      # store the current numbers
+#   python -m benchmarks.run --fail-on-regression # exit 1 on regressions (same host only)
+#
+# Synthetic MINiML data is served by a local mock FTP server, LLM and embedding calls
+# go to a local mock of the Azure OpenAI API and Pinecone is replaced by an in-memory
+# index. Every stage runs in a fresh process so its peak RSS is its own.
+
+STAGES = ['download', 'parse', 'upsert', 'extract', 'embed', 'retrieve']
+UNITS = {'retrieve': 'queries'}
+# Result fields compared with the baseline, and whether a higher value is better
+COMPARED = [('items_per_s', True), ('cold_items_per_s', True), ('retrieve_many_s', False)]
+# Host details that must match the baseline's before a regression fails the run
+FINGERPRINT_KEYS = ['machine', 'processor', 'cpu_count', 'python']
+
+PROFILES = {
+    'small': dict(series=40, min_samples=1, max_samples=20, field_size=150, superseries_samples=0, queries=50),
+    'default': dict(series=200, min_samples=1, max_samples=60, field_size=200, superseries_samples=0, queries=200),
+    'huge': dict(series=100, min_samples=1, max_samples=60, field_size=200, superseries_samples=20000, queries=200),
+}
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+GSE_FIELDS = ['high_level_indication', 'indication_detailed', 'drug_exposure', 'modalities',
+              'tissue_source', 'number_patients', 'sample_description', 'reasoning']
+
+
+# Same percentile definition as the /stats endpoint of search_service.py
+percentile = LatencyTracker.percentile
+
+
+def summarize(items, seconds, latencies):
+    latencies = sorted(latencies)
+    return {
+        'items': items,
+        'seconds': round(seconds, 4),
+        'items_per_s': round(items / seconds, 2) if seconds > 0 else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+    }
+
+
+def timed_calls(func, items):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        call_start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - call_start)
+    return time.perf_counter() - start, latencies
+
+
+# --- stages (each runs in its own process, with cwd set to the work directory) ------
+
+def xml_files(root='data/GSE_meta'):
+    return sorted(
+        os.path.join(folder, name)
+        for folder, _, files in os.walk(root)
+        for name in files if name.endswith('.xml')
+    )
+
+
+def load_database(db_path):
+    # Untimed setup for stages that need gse_metadata to be populated
+    import duckdb
+    from create_meta_db import create_metadata_table, extract_metadata, insert_metadata
+
+    con = duckdb.connect(db_path)
+    create_metadata_table(con)
+    if con.execute("SELECT COUNT(*) FROM gse_metadata").fetchone()[0] == 0:
+        for path in xml_files():
+            insert_metadata(con, extract_metadata(path))
+    con.close()
+
+
+def stage_download(config):
+    import get_meta_gse_mostrecent as downloader
+
+    downloader.FTP_PORT = config['ftp_port']
+    shutil.rmtree('download', ignore_errors=True)
+    os.makedirs('download')
+    os.chdir('download')  # the downloader writes to ./data/GSE_meta
+
+    ftp = downloader.connect_ftp('127.0.0.1')
+    try:
+        folders = downloader.get_most_recent_folders(ftp)
+    finally:
+        ftp.quit()
+    jobs = [(folder, subfolder) for folder in folders for subfolder in downloader.list_subfolders('127.0.0.1', folder)]
+
+    seconds, latencies = timed_calls(lambda job: downloader.download_and_extract_miniml('127.0.0.1', *job), jobs)
+    return summarize(len(jobs), seconds, latencies)
+
+
+def stage_parse(config):
+    from create_meta_db import extract_metadata
+
+    paths = xml_files()
+    seconds, latencies = timed_calls(extract_metadata, paths)
+    return summarize(len(paths), seconds, latencies)
+
+
+def stage_upsert(config):
+    import duckdb
+    from create_meta_db import create_metadata_table, extract_metadata, insert_metadata
+
+    if os.path.exists(config['db_path']):
+        os.remove(config['db_path'])
+    rows = [extract_metadata(path) for path in xml_files()]
+    con = duckdb.connect(config['db_path'])
+    create_metadata_table(con)
+    seconds, latencies = timed_calls(lambda metadata: insert_metadata(con, metadata), rows)
+    con.close()
+    return summarize(len(rows), seconds, latencies)
+
+
+class OfflinePrompt:
+    def compile(self, text):
+        return [{'role': 'user', 'content': f"Extract the study annotations.\n\n{text}"}]
+
+
+class OfflinePrompts:
+    def get_prompt(self, name):
+        return OfflinePrompt()
+
+
+def stage_extract(config):
+    from llm_extractor.extractor import GSEmetaExtractor
+    from llm_extractor.llm_client import LLMClient
+
+    load_database(config['db_path'])
+    # Keep the client's real retry logic but shorten its waits for mock rate limits
+    LLMClient.RETRY_DELAY = config['retry_delay']
+
+    latencies = []
+
+    class BenchmarkExtractor(GSEmetaExtractor):
+        langfuse = OfflinePrompts()
+
+        def process_study(self, row):
+            start = time.perf_counter()
+            try:
+                return super().process_study(row)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    extractor = BenchmarkExtractor(model='gpt-4o', db_path=config['db_path'])
+    shutil.rmtree(extractor.temp_folder, ignore_errors=True)
+    os.makedirs(extractor.temp_folder)
+    extractor.db_connection.execute("DELETE FROM parse_results")
+
+    start = time.perf_counter()
+    extractor.run_extraction(limit=0)
+    seconds = time.perf_counter() - start
+    return summarize(len(latencies), seconds, latencies)
+
+
+def vector_store_with_records(config):
+    from create_vectorstore import VectorStore
+
+    load_database(config['db_path'])
+    vector_store = VectorStore()
+    vector_store.pc = MockPinecone()
+    vector_store.ensure_index('bench-index')
+    records = vector_store.prepare_data(config['db_path'], limit=None).to_dict('records')
+    return vector_store, records
+
+
+def stage_embed(config):
+    vector_store, records = vector_store_with_records(config)
+    batch_size = config['embed_batch_size']
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    seconds, latencies = timed_calls(lambda batch: vector_store.upsert_records('bench-index', batch), batches)
+    return summarize(len(records), seconds, latencies)
+
+
+def stage_retrieve(config):
+    vector_store, records = vector_store_with_records(config)
+    for i in range(0, len(records), 64):
+        vector_store.upsert_records('bench-index', records[i:i + 64])
+
+    def clear_caches():
+        vector_store.result_cache.clear()
+        vector_store.embedding_cache.clear()
+
+    rng = random.Random(0)
+    # Cold: every query is new, so each one pays for an embedding and an index query
+    unique_queries = list(dict.fromkeys(' '.join(rng.sample(synthetic.WORDS, 4)) for _ in range(config['queries'])))
+    clear_caches()
+    cold_seconds, cold_latencies = timed_calls(lambda query: vector_store.retrieve('bench-index', query), unique_queries)
+
+    # Warm: a replayed dashboard, a pool of saved searches with popular ones repeating
+    pool = [' '.join(rng.sample(synthetic.WORDS, 3)) for _ in range(max(1, config['queries'] // 4))]
+    queries = [rng.choice(pool) for _ in range(config['queries'])]
+    clear_caches()
+    seconds, latencies = timed_calls(lambda query: vector_store.retrieve('bench-index', query), queries)
+
+    # Batched, also cold
+    clear_caches()
+    start = time.perf_counter()
+    vector_store.retrieve_many('bench-index', unique_queries)
+    many_seconds = time.perf_counter() - start
+
+    result = summarize(len(queries), seconds, latencies)
+    cold = summarize(len(unique_queries), cold_seconds, cold_latencies)
+    result.update({f'cold_{key}': cold[key] for key in ('items', 'items_per_s', 'p50_ms', 'p99_ms')})
+    result['retrieve_many_s'] = round(many_seconds, 4)
+    return result
+
+
+def run_stage(name, config):
+    os.chdir(config['workdir'])
+    # Progress bars and per-item prints would dominate the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        result = globals()[f'stage_{name}'](config)
+    # ru_maxrss is in kilobytes on Linux
+    result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+# --- driver ---------------------------------------------------------------------
+
+def offline_environment(openai_url):
+    os.environ.update({
+        'AZURE_OPENAI_ENDPOINT': openai_url,
+        'AZURE_OPENAI_API_KEY': 'mock',
+        'PINECONE_API_KEY': 'mock',
+        'GROQ_API_KEY': 'mock',
+        # Empty keys disable Langfuse tracing and stop .env files from filling them in
+        'LANGFUSE_PUBLIC_KEY': '',
+        'LANGFUSE_SECRET_KEY': '',
+        'LANGFUSE_HOST': 'http://127.0.0.1:9',
+        'NO_PROXY': '127.0.0.1,localhost',
+        'no_proxy': '127.0.0.1,localhost',
+    })
+
+
+def host_fingerprint():
+    processor = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            processor = next(line.split(':', 1)[1].strip() for line in f if line.startswith('model name'))
+    except (OSError, StopIteration):
+        pass
+    return {
+        'system': platform.platform(),
+        'machine': platform.machine(),
+        'processor': processor,
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+    }
+
+
+def same_host(host, reference):
+    # Patch releases of Python do not change the numbers meaningfully
+    def key(fingerprint):
+        values = {name: fingerprint.get(name) for name in FINGERPRINT_KEYS}
+        values['python'] = '.'.join(str(values['python']).split('.')[:2])
+        return values
+    return reference is not None and key(host) == key(reference)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'stage':<10}{'items':>8}{'items/s':>12}{'p50 ms':>11}{'p99 ms':>11}{'RSS MB':>9}   vs baseline")
+    for name, result in results.items():
+        line = (f"{name:<10}{result['items']:>8}{result['items_per_s'] or 0:>12.1f}"
+                f"{result['p50_ms'] or 0:>11.2f}{result['p99_ms'] or 0:>11.2f}{result['peak_rss_mb']:>9.1f}")
+        reference = baseline.get(name) or {}
+        changes = []
+        for metric, higher_is_better in COMPARED:
+            if not reference.get(metric) or not result.get(metric):
+                continue
+            change = result[metric] / reference[metric] - 1
+            label = {'items_per_s': f"{UNITS.get(name, 'series')}/s",
+                     'cold_items_per_s': 'cold queries/s'}.get(metric, metric)
+            flag = ''
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                flag = ' REGRESSION'
+                regressions.append(f"{name} {label}")
+            changes.append(f"{change:+.0%} {label}{flag}")
+        if changes:
+            line += '   ' + ', '.join(changes)
+        print(line)
+        if 'cold_items_per_s' in result:
+            print(f"{'  cold':<10}{result['cold_items']:>8}{result['cold_items_per_s'] or 0:>12.1f}"
+                  f"{result['cold_p50_ms'] or 0:>11.2f}{result['cold_p99_ms'] or 0:>11.2f}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmarks with synthetic GEO data and mock providers.")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='default')
+    parser.add_argument('--stages', default=','.join(STAGES), help=f"Comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument('--series', type=int, help="Number of synthetic series")
+    parser.add_argument('--min-samples', type=int)
+    parser.add_argument('--max-samples', type=int)
+    parser.add_argument('--field-size', type=int, help="Approximate characters per free-text field")
+    parser.add_argument('--superseries-samples', type=int, help="Make the first series a SuperSeries with this many samples")
+    parser.add_argument('--queries', type=int, help="Queries replayed in the retrieve stage")
+    parser.add_argument('--ftp-latency', type=float, default=0.0, help="Seconds added to every FTP control reply")
+    parser.add_argument('--ftp-bandwidth', type=int, help="Download throttle in bytes per second")
+    parser.add_argument('--chat-latency', type=float, default=0.0, help="Seconds per chat completion")
+    parser.add_argument('--embedding-latency', type=float, default=0.0, help="Seconds per embedding request")
+    parser.add_argument('--rate-limit', type=float, help="Requests per second before the mock API answers 429")
+    parser.add_argument('--embed-batch-size', type=int, default=64)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the baseline for the profile")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="Exit with status 1 on regressions, if the baseline was recorded on a matching host")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed throughput drop before a stage counts as a regression")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    parser.add_argument('--workdir', help="Keep generated data here instead of a temporary directory")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    profile = dict(PROFILES[args.profile])
+    for key in profile:
+        if getattr(args, key) is not None:
+            profile[key] = getattr(args, key)
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='geo_bench_')
+    os.makedirs(workdir, exist_ok=True)
+
+    plan = synthetic.series_plan(profile['series'], profile['min_samples'], profile['max_samples'],
+                                 profile['superseries_samples'])
+    print(f"Generating {len(plan)} series ({sum(n for _, n in plan)} samples) in {workdir}")
+    shutil.rmtree(os.path.join(workdir, 'data', 'GSE_meta'), ignore_errors=True)
+    paths = synthetic.write_corpus(os.path.join(workdir, 'data', 'GSE_meta'), plan, profile['field_size'])
+
+    ftp_files = {}
+    for (series_id, _), path in zip(plan, paths):
+        with open(path) as f:
+            archive = synthetic.miniml_tgz(series_id, f.read())
+        ftp_files[f"/geo/series/{synthetic.series_folder(series_id)}/{series_id}/miniml/{series_id}_family.xml.tgz"] = archive
+    ftp_server = MockFTPServer(ftp_files, latency=args.ftp_latency, bytes_per_second=args.ftp_bandwidth).start()
+    openai_server = MockOpenAIServer(GSE_FIELDS, chat_latency=args.chat_latency, embedding_latency=args.embedding_latency,
+                                     rate_limit=args.rate_limit).start()
+    offline_environment(openai_server.url)
+
+    config = {
+        'workdir': workdir,
+        'db_path': os.path.join(workdir, 'bench.db'),
+        'ftp_port': ftp_server.port,
+        'queries': profile['queries'],
+        'embed_batch_size': args.embed_batch_size,
+        'retry_delay': 0.5,
+    }
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    try:
+        for name in stages:
+            print(f"Running {name}...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[name] = executor.submit(run_stage, name, config).result()
+    finally:
+        ftp_server.shutdown()
+        openai_server.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if openai_server.rate_limited:
+        print(f"Mock API answered {openai_server.rate_limited} of {openai_server.requests} requests with 429")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(args.profile, {})
+    host = host_fingerprint()
+    regressions = compare(results, baseline.get('results', {}), args.tolerance)
+
+    report = {'profile': args.profile, 'settings': profile, 'host': host, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        baselines[args.profile] = {'host': host, 'settings': profile, 'results': results}
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2)
+        print(f"Baseline for profile '{args.profile}' saved to {args.baseline}")
+        return
+
+    if not regressions:
+        return
+    print(f"Throughput regressions: {', '.join(regressions)}")
+    if not same_host(host, baseline.get('host')):
+        recorded_on = baseline.get('host') or {}
+        print(f"The baseline was recorded on a different host ({recorded_on.get('processor', 'unknown CPU')}, "
+              f"{recorded_on.get('cpu_count', '?')} CPUs, Python {recorded_on.get('python', '?')}); "
+              f"re-record it here with --save-baseline before relying on the comparison")
+    elif args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
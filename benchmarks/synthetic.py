@@ -0,0 +1,133 @@
+import io
+import os
+import random
+import tarfile
+from xml.sax.saxutils import escape
+
+# Generates MINiML family files that look enough like GEO's to exercise
+# create_meta_db.extract_metadata: contributors, one Series and any number of Samples
+# with channels, characteristics, protocols and supplementary files.
+
+NAMESPACE = "http://www.ncbi.nlm.nih.gov/geo/info/MINiML"
+
+WORDS = (
+    "tumor cell expression sequencing patient treatment control tissue blood liver "
+    "breast lung kidney brain rna dna chip single cell library protocol sample cohort "
+    "inhibitor dose response knockdown mutation pathway immune stromal organoid"
+).split()
+ORGANISMS = ["Homo sapiens", "Homo sapiens", "Homo sapiens", "Mus musculus", "Rattus norvegicus"]
+COUNTRIES = ["Germany", "United Kingdom", "Japan", "China", "France", "Canada", "USA"]
+STRATEGIES = ["RNA-Seq", "ChIP-Seq", "ATAC-seq", "scRNA-seq", "Bisulfite-Seq"]
+
+
+def text(rng, size):
+    """
+    Random words adding up to roughly size characters.
+    """
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return escape(' '.join(words))
+
+
+def generate_series_xml(series_id, n_samples, field_size=200, seed=None):
+    rng = random.Random(seed if seed is not None else series_id)
+    organism = rng.choice(ORGANISMS)
+    parts = [f'<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n<MINiML xmlns="{NAMESPACE}" version="0.5.0">']
+
+    for i in range(rng.randint(1, 4)):
+        parts.append(
+            f'<Contributor iid="contrib{i}"><Person><First>A</First><Last>Author{i}</Last></Person>'
+            f'<Organization>Institute {rng.randint(1, 500)}</Organization>'
+            f'<Address><City>City</City><Country>{rng.choice(COUNTRIES)}</Country></Address></Contributor>'
+        )
+
+    for i in range(n_samples):
+        characteristics = ''.join(
+            f'<Characteristics tag="{tag}">{text(rng, field_size // 8)}</Characteristics>'
+            for tag in ('tissue', 'treatment', 'cell type', 'genotype')
+        )
+        supplementary = ''.join(
+            f'<Supplementary-Data type="TXT">ftp://ftp.ncbi.nlm.nih.gov/geo/samples/GSM{i}/suppl/file{j}.txt.gz</Supplementary-Data>'
+            for j in range(rng.randint(0, 3))
+        )
+        parts.append(
+            f'<Sample iid="GSM{series_id[3:]}{i:05d}">'
+            f'<Title>{text(rng, 40)}</Title>'
+            f'<Channel-Count>1</Channel-Count>'
+            f'<Channel position="1">'
+            f'<Source>{text(rng, 30)}</Source>'
+            f'<Organism taxid="9606">{organism}</Organism>'
+            f'{characteristics}'
+            f'<Treatment-Protocol>{text(rng, field_size)}</Treatment-Protocol>'
+            f'<Molecule>total RNA</Molecule>'
+            f'<Extract-Protocol>{text(rng, field_size)}</Extract-Protocol>'
+            f'</Channel>'
+            f'<Data-Processing>{text(rng, field_size)}</Data-Processing>'
+            f'<Library-Strategy>{rng.choice(STRATEGIES)}</Library-Strategy>'
+            f'<Library-Source>transcriptomic</Library-Source>'
+            f'{supplementary}'
+            f'</Sample>'
+        )
+
+    parts.append(
+        f'<Series iid="{series_id}">'
+        f'<Title>{text(rng, 80)}</Title>'
+        f'<Pubmed-ID>{rng.randint(10000000, 39999999)}</Pubmed-ID>'
+        f'<Summary>{text(rng, field_size * 4)}</Summary>'
+        f'<Overall-Design>{text(rng, field_size * 2)}</Overall-Design>'
+        f'</Series>'
+    )
+    parts.append('</MINiML>\n')
+    return '\n'.join(parts)
+
+
+def series_plan(n_series, min_samples=1, max_samples=50, superseries_samples=0, first_id=200000, seed=0):
+    """
+    Returns [(series_id, n_samples)]. With superseries_samples set, the first series is
+    a SuperSeries of that size.
+    """
+    rng = random.Random(seed)
+    plan = [(f"GSE{first_id + i}", rng.randint(min_samples, max_samples)) for i in range(n_series)]
+    if superseries_samples and plan:
+        plan[0] = (plan[0][0], superseries_samples)
+    return plan
+
+
+def series_folder(series_id):
+    # GEO groups series by thousands: GSE200123 lives in GSE200nnn
+    return f"{series_id[:-3]}nnn"
+
+
+def write_corpus(out_dir, plan, field_size=200):
+    """
+    Writes one <series>_family.xml per planned series under out_dir/<GSEnnn>/ and
+    returns the file paths.
+    """
+    paths = []
+    for series_id, n_samples in plan:
+        folder = os.path.join(out_dir, series_folder(series_id))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{series_id}_family.xml")
+        with open(path, 'w') as f:
+            f.write(generate_series_xml(series_id, n_samples, field_size))
+        paths.append(path)
+    return paths
+
+
+def miniml_tgz(series_id, xml):
+    """
+    Packs a family file the way GEO's miniml/<series>_family.xml.tgz archives do,
+    including a non-XML member that the downloader has to skip.
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, data in ((f"{series_id}_family.xml", xml.encode('utf-8')),
+                           (f"{series_id}-tbl-1.txt", b"ID_REF\tVALUE\n")):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
@@ -1,14 +1,18 @@
 import os
 import xml.etree.ElementTree as ET
 import duckdb
+import instrumentation
 
-# Connect to DuckDB
-if os.path.exists('gse_metadata.db'):
-    os.remove('gse_metadata.db')
-con = duckdb.connect('gse_metadata.db')
+METADATA_COLUMNS = [
+    'series_id', 'title', 'summary', 'overall_design', 'organism', 'treatment', 'treatment_protocol',
+    'source', 'characteristics', 'molecule', 'extract_protocol', 'data_processing',
+    'library_strategy', 'library_source', 'supplementary_data', 'authors_countries',
+    'authors_institutions', 'pubmed_id'
+]
 
-# Create a table to store the GSE metadata
-con.execute('''
+def create_metadata_table(con):
+    # Create a table to store the GSE metadata
+    con.execute('''
     CREATE TABLE IF NOT EXISTS gse_metadata (
         series_id VARCHAR,
         title VARCHAR,
@@ -29,8 +33,9 @@ con.execute('''
         authors_institutions VARCHAR,
         pubmed_id VARCHAR
     )
-''')
+    ''')
 
+@instrumentation.timed('parse', 'xml_file')
 def extract_metadata(xml_file):
     tree = ET.parse(xml_file)
     root = tree.getroot()
@@ -106,29 +111,52 @@ def extract_metadata(xml_file):
         'pubmed_id': pubmed_id
     }
 
-# Process XML files in all subfolders
-xml_dir = 'data/GSE_meta'
-for root, dirs, files in os.walk(xml_dir):
-    for filename in files:
-        if filename.endswith('.xml'):
-            file_path = os.path.join(root, filename)
-            try:
-                metadata = extract_metadata(file_path)
-                con.execute('''
-                    INSERT INTO gse_metadata 
-                    (series_id, title, summary, overall_design, organism, treatment, treatment_protocol, 
-                    source, characteristics, molecule, extract_protocol, data_processing, 
-                    library_strategy, library_source, supplementary_data, authors_countries, 
-                    authors_institutions, pubmed_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', tuple(metadata.values()))
-                print(f"Processed: {file_path}")
-            except Exception as e:
-                print(f"Error processing {file_path}: {str(e)}")
+def insert_metadata(con, metadata):
+    with instrumentation.timer('upsert', 'insert'):
+        con.execute(f'''
+            INSERT INTO gse_metadata ({', '.join(METADATA_COLUMNS)})
+            VALUES ({', '.join(['?' for _ in METADATA_COLUMNS])})
+        ''', [metadata[column] for column in METADATA_COLUMNS])
+    instrumentation.incr('upsert', 'rows')
 
-# Verify the data
-result = con.execute("SELECT COUNT(*) FROM gse_metadata").fetchone()
-print(f"Total records inserted: {result[0]}")
+def upsert_metadata(con, metadata):
+    # gse_metadata has no key, so replace any earlier version of the series by hand
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute("DELETE FROM gse_metadata WHERE series_id = ?", [metadata['series_id']])
+        insert_metadata(con, metadata)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
 
-# Close the connection
-con.close()
+def main():
+    # Connect to DuckDB
+    if os.path.exists('gse_metadata.db'):
+        os.remove('gse_metadata.db')
+    con = duckdb.connect('gse_metadata.db')
+    create_metadata_table(con)
+
+    # Process XML files in all subfolders
+    xml_dir = 'data/GSE_meta'
+    for root, dirs, files in os.walk(xml_dir):
+        for filename in files:
+            if filename.endswith('.xml'):
+                file_path = os.path.join(root, filename)
+                try:
+                    metadata = extract_metadata(file_path)
+                    insert_metadata(con, metadata)
+                    print(f"Processed: {file_path}")
+                except Exception as e:
+                    instrumentation.incr('parse', 'errors')
+                    print(f"Error processing {file_path}: {str(e)}")
+
+    # Verify the data
+    result = con.execute("SELECT COUNT(*) FROM gse_metadata").fetchone()
+    print(f"Total records inserted: {result[0]}")
+
+    # Close the connection
+    con.close()
+
+if __name__ == "__main__":
+    main()
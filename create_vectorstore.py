@@ -1,18 +1,62 @@
 import os
-from tqdm import tqdm
 import logging
-from pinecone import Pinecone, ServerlessSpec
 import time
-import pandas as pd
-import duckdb
 from dotenv import load_dotenv
 import json
-from openai import AzureOpenAI  # Update import
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import instrumentation
+
+# pinecone, openai, pandas, duckdb and tqdm are imported where they are used so that
+# importing this module (e.g. from retrieve_files.py or search_service.py) stays cheap
 
 load_dotenv()
 
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after ttl seconds.
+    """
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class RetrievalError(Exception):
+    """
+    Raised by retrieve/retrieve_many when retries are exhausted and the store was
+    created with raise_on_failure=True.
+    """
+
 class VectorStore:
-    def __init__(self):
+    def __init__(self, max_retries=5, base_wait_time=20, raise_on_failure=False):
+        from pinecone import Pinecone
+        from openai import AzureOpenAI
+
         self.pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
         self.METADATA_SIZE_LIMIT = 40960
         self.FIELD_PRIORITY = [
@@ -22,6 +66,12 @@ class VectorStore:
         ]
         self.TRUNCATE_FIELD_SIZE = 1000
 
+        # Query retry budget; long-running callers such as search_service.py use a short
+        # one and raise_on_failure so an outage surfaces instead of blocking workers
+        self.max_retries = max_retries
+        self.base_wait_time = base_wait_time
+        self.raise_on_failure = raise_on_failure
+
         # Initialize Azure OpenAI client
         self.azure_client = AzureOpenAI(
             azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
@@ -29,7 +79,16 @@ class VectorStore:
             api_version="2024-05-01-preview"
         )
 
+        # Query-side caches; embeddings are stable, results may change as the index grows
+        self.embedding_cache = TTLCache(maxsize=4096, ttl=24 * 3600)
+        self.result_cache = TTLCache(maxsize=1024, ttl=600)
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
     def prepare_data(self, db_path, limit=1000):
+        import duckdb
+        import pandas as pd
+
         # Connect to the DuckDB database
         conn = duckdb.connect(db_path)
 
@@ -44,14 +103,7 @@ class VectorStore:
             rows = conn.execute("SELECT * FROM gse_metadata").fetchall()
 
         # Transform each row into a JSON object with limited metadata size
-        data = []
-        for row in rows:
-            row_dict = dict(zip(columns, row))
-            json_content = self.limit_metadata_size(row_dict, self.FIELD_PRIORITY, self.METADATA_SIZE_LIMIT)
-            data.append({
-                'id': str(row_dict.get('series_id', 'NA')),  # Assuming there is a 'series_id' column
-                'content': json_content
-            })
+        data = [self.prepare_record(dict(zip(columns, row))) for row in rows]
 
         conn.close()
 
@@ -60,6 +112,13 @@ class VectorStore:
         print(f"Total number of entries: {len(df)}")
         return df
 
+    def prepare_record(self, row_dict):
+        json_content = self.limit_metadata_size(row_dict, self.FIELD_PRIORITY, self.METADATA_SIZE_LIMIT)
+        return {
+            'id': str(row_dict.get('series_id', 'NA')),  # Assuming there is a 'series_id' column
+            'content': json_content
+        }
+
     def limit_metadata_size(self, row_dict, priority_fields, size_limit):
         """
         Constructs a metadata dictionary by adding fields based on priority.
@@ -122,7 +181,9 @@ class VectorStore:
 
         return metadata
 
-    def create_or_load_index(self, db_path, index_name='gse-index'):
+    def ensure_index(self, index_name='gse-index'):
+        from pinecone import ServerlessSpec
+
         # Check if the index exists
         index_names = [index['name'] for index in self.pc.list_indexes()]
         if index_name in index_names:
@@ -142,9 +203,14 @@ class VectorStore:
             while not self.pc.describe_index(index_name).status['ready']:
                 time.sleep(1)
 
+    def create_or_load_index(self, db_path, index_name='gse-index'):
+        from tqdm import tqdm
+
+        self.ensure_index(index_name)
+
         df_data = self.prepare_data(db_path)
 
-        index = self.pc.Index(index_name)
+        index = self.get_index(index_name)
 
         # Get list of IDs from df_data
         all_ids = df_data['id'].tolist()
@@ -159,7 +225,8 @@ class VectorStore:
         # Fetch existing IDs in batches
         for i in tqdm(range(0, len(all_ids), batch_size), desc="Checking existing IDs"):
             batch_ids = all_ids[i:i+batch_size]
-            fetch_response = index.fetch(ids=batch_ids, namespace='ns1')
+            with instrumentation.timer('embed', 'index_fetch'):
+                fetch_response = index.fetch(ids=batch_ids, namespace='ns1')
             existing_ids.update(fetch_response['vectors'].keys())
 
         # Determine IDs not yet in the index
@@ -174,15 +241,11 @@ class VectorStore:
 
         print("Processing new entries and upserting to the index...")
         for _, row in tqdm(df_data.iterrows(), total=df_data.shape[0], desc="Processing entries"):
-            # Prepare input text by concatenating key-value pairs
-            input_text = ' '.join([f"{key}: {value}" for key, value in row['content'].items()])
+            input_text = self.record_text(row['content'])
 
             # Generate embedding using Azure OpenAI
             try:
-                response = self.azure_client.embeddings.create(
-                    model=os.getenv("AZURE_OPENAI_ENDPOINT"), # Use your actual deployment name
-                    input=input_text
-                )
+                response = self.create_embeddings([input_text], 'embed')
                 embedding = response.data[0].embedding
             except Exception as e:
                 print(f"Embedding failed for ID {row['id']}: {e}. Skipping.")
@@ -197,51 +260,191 @@ class VectorStore:
 
             try:
                 # Upsert vector into the index
-                index.upsert(
-                    vectors=[vector],
-                    namespace="ns1"
-                )
+                with instrumentation.timer('embed', 'index_upsert'):
+                    index.upsert(
+                        vectors=[vector],
+                        namespace="ns1"
+                    )
             except Exception as e:
                 print(f"Failed to upsert vector ID {row['id']}: {e}")
                 continue
 
-    def retrieve(self, index_name, query):
-        max_retries = 5
-        base_wait_time = 20
+        # Cached result sets predate the new vectors
+        self.result_cache.clear()
 
-        for attempt in range(max_retries):
-            try:
-                index = self.pc.Index(index_name)
+    def create_embeddings(self, inputs, stage):
+        instrumentation.observe(stage, 'embedding_batch_size', len(inputs))
+        with instrumentation.timer(stage, 'embedding_request'):
+            response = self.azure_client.embeddings.create(
+                model=os.getenv("AZURE_OPENAI_ENDPOINT"), # Use your actual deployment name
+                input=inputs
+            )
+        if getattr(response, 'usage', None):
+            instrumentation.observe(stage, 'embedding_tokens', response.usage.total_tokens)
+        return response
 
-                # Generate embedding for the query using Azure OpenAI
-                response = self.azure_client.embeddings.create(
-                    model=os.getenv("AZURE_OPENAI_ENDPOINT"), # Use your actual deployment name
-                    input=query
-                )
-                query_embedding = response.data[0].embedding
-
-                results = index.query(
-                    namespace="ns1",
-                    vector=query_embedding,
-                    top_k=10,
-                    include_values=False,
-                    include_metadata=True
-                )
+    @staticmethod
+    def record_text(content):
+        # Prepare input text by concatenating key-value pairs
+        return ' '.join([f"{key}: {value}" for key, value in content.items()])
 
-                metadata = [d['metadata'] for d in results['matches']]
-                return metadata
+    def upsert_records(self, index_name, records):
+        """
+        Embeds a batch of prepared records in one request and upserts them together.
+        Returns the number of vectors written.
+        """
+        if not records:
+            return 0
+
+        try:
+            response = self.create_embeddings([self.record_text(record['content']) for record in records], 'embed')
+        except Exception as e:
+            print(f"Embedding failed for {len(records)} records: {e}. Skipping.")
+            return 0
+
+        vectors = [
+            {
+                "id": records[item.index]['id'],
+                "values": item.embedding,
+                "metadata": records[item.index]['content']
+            }
+            for item in response.data
+        ]
+
+        try:
+            with instrumentation.timer('embed', 'index_upsert'):
+                self.get_index(index_name).upsert(vectors=vectors, namespace="ns1")
+        except Exception as e:
+            print(f"Failed to upsert {len(vectors)} vectors: {e}")
+            return 0
 
+        self.result_cache.clear()
+        return len(vectors)
+
+    def get_index(self, index_name):
+        # Reuse index handles; building one per query costs a control-plane round trip
+        with self._index_lock:
+            if index_name not in self._indexes:
+                self._indexes[index_name] = self.pc.Index(index_name)
+            return self._indexes[index_name]
+
+    def embed_queries(self, queries):
+        """
+        Returns one embedding per query, embedding all cache misses in a single request.
+        """
+        embeddings = {}
+        missing = []
+        for query in queries:
+            cached = self.embedding_cache.get(query)
+            if cached is not None:
+                instrumentation.incr('retrieve', 'embedding_cache_hits')
+                embeddings[query] = list(cached)
+            elif query not in missing:
+                missing.append(query)
+
+        if missing:
+            instrumentation.incr('retrieve', 'embedding_cache_misses', len(missing))
+            response = self.create_embeddings(missing, 'retrieve')
+            for item in response.data:
+                query = missing[item.index]
+                embeddings[query] = item.embedding
+                self.embedding_cache.set(query, item.embedding)
+
+        return [embeddings[query] for query in queries]
+
+    @instrumentation.timed('retrieve', 'index_query')
+    def query_index(self, index_name, query_embedding, top_k=10):
+        results = self.get_index(index_name).query(
+            namespace="ns1",
+            vector=query_embedding,
+            top_k=top_k,
+            include_values=False,
+            include_metadata=True
+        )
+        return [d['metadata'] for d in results['matches']]
+
+    def _with_retries(self, func, *args):
+        max_retries = self.max_retries
+        base_wait_time = self.base_wait_time
+
+        for attempt in range(max_retries):
+            try:
+                return func(*args)
             except Exception as e:
                 print(f"Attempt {attempt + 1} failed: {e}")
                 if attempt < max_retries - 1:
                     wait_time = base_wait_time * (2 ** attempt)
                     print(f"Retrying in {wait_time} seconds...")
+                    instrumentation.incr('retrieve', 'retries')
+                    instrumentation.incr('retrieve', 'backoff_seconds', wait_time)
                     time.sleep(wait_time)
                 else:
+                    if self.raise_on_failure:
+                        raise RetrievalError(f"Retrieval failed after {max_retries} attempts: {e}") from e
                     print("Max retries reached. Returning empty list.")
+                    return None
+
+        return None  # Should never be reached
+
+    @staticmethod
+    def _copy_results(metadata):
+        # Cached result sets are shared between callers; hand out copies they may modify
+        return [dict(d) for d in metadata]
+
+    def retrieve(self, index_name, query, top_k=10):
+        cache_key = (index_name, query, top_k)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            instrumentation.incr('retrieve', 'result_cache_hits')
+            return self._copy_results(cached)
+
+        def run():
+            query_embedding = self.embed_queries([query])[0]
+            return self.query_index(index_name, query_embedding, top_k)
+
+        metadata = self._with_retries(run)
+        if metadata is None:
+            return []
+        self.result_cache.set(cache_key, tuple(metadata))
+        return self._copy_results(metadata)
+
+    def retrieve_many(self, index_name, queries, top_k=10, max_workers=8):
+        """
+        Retrieves results for several queries at once. Cached queries are answered
+        directly, the remaining ones are embedded in one batched request and queried
+        against the index concurrently. Returns one result list per query, in order.
+        """
+        results = {}
+        pending = []
+        for query in queries:
+            if query in results or query in pending:
+                continue
+            cached = self.result_cache.get((index_name, query, top_k))
+            if cached is not None:
+                instrumentation.incr('retrieve', 'result_cache_hits')
+                results[query] = cached
+            else:
+                pending.append(query)
+
+        if pending:
+            query_embeddings = self._with_retries(self.embed_queries, pending)
+            if query_embeddings is None:
+                query_embeddings = [None] * len(pending)
+
+            def run(query, query_embedding):
+                if query_embedding is None:
                     return []
+                metadata = self._with_retries(self.query_index, index_name, query_embedding, top_k)
+                if metadata is None:
+                    return []
+                self.result_cache.set((index_name, query, top_k), tuple(metadata))
+                return metadata
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for query, metadata in zip(pending, executor.map(run, pending, query_embeddings)):
+                    results[query] = metadata
 
-        return []  # Should never be reached
+        return [self._copy_results(results[query]) for query in queries]
 
 if __name__ == "__main__":
     vector_store = VectorStore()
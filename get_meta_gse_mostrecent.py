@@ -4,6 +4,16 @@ import tarfile
 import re
 import glob
 import time
+import instrumentation
+
+FTP_PORT = 21  # overridden by the benchmarks to point at a local mock server
+
+def connect_ftp(ftp_url):
+    ftp = ftplib.FTP()
+    ftp.connect(ftp_url, FTP_PORT)
+    ftp.login()
+    return ftp
+
 def get_most_recent_folders(ftp):
     ftp.cwd("/geo/series/")
     all_folders = ftp.nlst()
@@ -19,8 +29,7 @@ def get_most_recent_folders(ftp):
 def download_and_extract_miniml(ftp_url, main_folder, subfolder):
     
 #    time.sleep(0.1)
-    ftp = ftplib.FTP(ftp_url)
-    ftp.login()
+    ftp = connect_ftp(ftp_url)
     max_retries = 2
     retry_delay = 3
     for attempt in range(max_retries):
@@ -36,44 +45,48 @@ def download_and_extract_miniml(ftp_url, main_folder, subfolder):
             tgz_files = [f for f in ftp.nlst() if f.endswith('.tgz')]
             if not tgz_files:
                 print(f"No .tgz file found in {main_folder}/{subfolder}/miniml")
-                return
+                return []
             
             tgz_file = tgz_files[0]
             
             # Download the .tgz file
             local_file = f"{subfolder}_miniml.tgz"
-            with open(local_file, 'wb') as f:
-                ftp.retrbinary(f"RETR {tgz_file}", f.write)
+            with open(local_file, 'wb') as f, instrumentation.timer('download', 'ftp_retr'):
+                def write(chunk):
+                    f.write(chunk)
+                    instrumentation.incr('download', 'bytes', len(chunk))
+                ftp.retrbinary(f"RETR {tgz_file}", write)
             
             # Create the data/GSE_meta/{main_folder} directory if it doesn't exist
             os.makedirs(f"data/GSE_meta/{main_folder}", exist_ok=True)
             
-            # Extract the contents
-            with tarfile.open(local_file, "r:gz") as tar:
-                tar.extractall(path=f"data/GSE_meta/{main_folder}")
+            # Extract only the XML files; other members are not needed and skipping
+            # them keeps concurrent downloads into the same folder independent
+            with tarfile.open(local_file, "r:gz") as tar, instrumentation.timer('download', 'untar'):
+                xml_members = [m for m in tar.getmembers() if m.isfile() and m.name.endswith('.xml')]
+                tar.extractall(path=f"data/GSE_meta/{main_folder}", members=xml_members)
             
             # Remove the .tgz file
             os.remove(local_file)
             
-            # Delete non-XML files
-            for root, dirs, files in os.walk(f"data/GSE_meta/{main_folder}"):
-                for file in files:
-                    if not file.endswith('.xml'):
-                        os.remove(os.path.join(root, file))
-            
+            instrumentation.incr('download', 'series')
             print(f"Successfully processed {main_folder}/{subfolder}")
             
-            return
+            return [os.path.join(f"data/GSE_meta/{main_folder}", m.name) for m in xml_members]
         except (ftplib.error_perm, EOFError) as e:
                     if attempt < max_retries - 1:
                         print(f"Attempt {attempt + 1} failed. Retrying in {retry_delay} seconds...")
+                        instrumentation.incr('download', 'retries')
+                        instrumentation.incr('download', 'backoff_seconds', retry_delay)
                         time.sleep(retry_delay)
                         # Reconnect FTP
-                        ftp = ftplib.FTP("ftp.ncbi.nlm.nih.gov")
-                        ftp.login()
+                        ftp = connect_ftp(ftp_url)
                         retry_delay *= 2  # Exponential backoff
                     else:
                         print(f"Failed after {max_retries} attempts: {str(e)}")
+                        instrumentation.incr('download', 'failures')
+
+    return []
 
 def folder_already_processed(main_folder):
     folder_path = f"data/GSE_meta/{main_folder}"
@@ -82,13 +95,9 @@ def folder_already_processed(main_folder):
         return len(xml_files) > 0
     return False
 
-def process_folder(ftp_url, folder):
-    if folder_already_processed(folder):
-        print(f"Folder {folder} has already been processed. Skipping.")
-        return
-
-    ftp = ftplib.FTP("ftp.ncbi.nlm.nih.gov")
-    ftp.login()
+def list_subfolders(ftp_url, folder):
+    ftp = connect_ftp(ftp_url)
+    subfolders = []
     try:
         ftp.cwd(f"/geo/series/{folder}")
         subfolders = ftp.nlst()
@@ -97,14 +106,21 @@ def process_folder(ftp_url, folder):
         print(f"Error accessing {folder}: {str(e)}")
         
     ftp.quit()
+    return subfolders
+
+def process_folder(ftp_url, folder):
+    if folder_already_processed(folder):
+        print(f"Folder {folder} has already been processed. Skipping.")
+        return
+
+    subfolders = list_subfolders(ftp_url, folder)
     
     for subfolder in subfolders:
         download_and_extract_miniml(ftp_url, folder, subfolder)
 
 def main():
     # Connect to the FTP server
-    ftp = ftplib.FTP("ftp.ncbi.nlm.nih.gov")
-    ftp.login()
+    ftp = connect_ftp("ftp.ncbi.nlm.nih.gov")
 
     try:
         # Get the 40 most recent folders
@@ -0,0 +1,263 @@
+import atexit
+import functools
+import os
+import re
+import signal
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Lightweight per-stage timers and counters shared by all scripts.
+#
+# Enable with GEO_METRICS=1. Values are aggregated in memory (count, sum, min, max per
+# metric) and written to the Prometheus textfile GEO_METRICS_TEXTFILE (default
+# data/metrics/<script>.prom), which node_exporter's textfile collector can pick up,
+# every GEO_METRICS_INTERVAL seconds (default 60, 0 to disable). On exit or SIGTERM
+# they are also written to the run_metrics table in GEO_METRICS_DB (default
+# data/metrics/run_metrics.db). That is a separate database on purpose: the scripts
+# hold gse_metadata.db open themselves, sometimes read-only, and shard nodes have no
+# gse_metadata.db at all. When disabled every call returns immediately.
+#
+#   with instrumentation.timer('parse', 'xml_file'):
+#       ...
+#   instrumentation.incr('download', 'bytes', len(chunk))
+#   instrumentation.observe('embed', 'batch_size', len(batch))
+
+ENABLED = os.getenv('GEO_METRICS', '').lower() in ('1', 'true', 'yes')
+RUN_ID = uuid.uuid4().hex[:12]
+SCRIPT = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+DB_PATH = os.getenv('GEO_METRICS_DB', 'data/metrics/run_metrics.db')
+# One file per script so concurrent scripts do not overwrite each other's metrics
+TEXTFILE_PATH = os.getenv('GEO_METRICS_TEXTFILE', f'data/metrics/{SCRIPT}.prom')
+INTERVAL = float(os.getenv('GEO_METRICS_INTERVAL', '60') or 0)
+
+# Reentrant because the SIGTERM handler flushes on the main thread, possibly while that
+# thread is inside _record or flush
+_lock = threading.RLock()
+_flush_lock = threading.RLock()
+_metrics = {}  # (stage, name, kind) -> [count, total, min, max]
+
+
+def _record(stage, name, kind, value):
+    key = (stage, name, kind)
+    with _lock:
+        entry = _metrics.get(key)
+        if entry is None:
+            _metrics[key] = [1, value, value, value]
+        else:
+            entry[0] += 1
+            entry[1] += value
+            if value < entry[2]:
+                entry[2] = value
+            if value > entry[3]:
+                entry[3] = value
+
+
+class _Timer:
+    __slots__ = ('stage', 'name', 'start')
+
+    def __init__(self, stage, name):
+        self.stage = stage
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.stage, self.name, 'timer', time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(stage, name):
+    """
+    Context manager that records the wall time of its block in seconds.
+    """
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(stage, name)
+
+
+def timed(stage, name):
+    """
+    Decorator form of timer().
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Timer(stage, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def incr(stage, name, amount=1):
+    """
+    Adds amount to a counter (bytes, rows, retries, ...).
+    """
+    if ENABLED:
+        _record(stage, name, 'counter', amount)
+
+
+def observe(stage, name, value):
+    """
+    Records a single value whose distribution matters (batch sizes, tokens per call, ...).
+    """
+    if ENABLED:
+        _record(stage, name, 'summary', value)
+
+
+def snapshot():
+    with _lock:
+        return {key: list(values) for key, values in _metrics.items()}
+
+
+def enable():
+    global ENABLED
+    if not ENABLED:
+        ENABLED = True
+        _start()
+
+
+def _prometheus_name(*parts):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', '_'.join(('geo_parser',) + parts)).lower()
+
+
+def write_textfile(path, metrics):
+    lines = []
+    labels = f'script="{SCRIPT}"'
+    for (stage, name, kind), (count, total, minimum, maximum) in sorted(metrics.items()):
+        if kind == 'timer':
+            base = _prometheus_name(stage, name, 'seconds')
+            lines += [
+                f"# TYPE {base} summary",
+                f"{base}_sum{{{labels}}} {total:.6f}",
+                f"{base}_count{{{labels}}} {count}",
+                f"# TYPE {base}_max gauge",
+                f"{base}_max{{{labels}}} {maximum:.6f}",
+            ]
+        elif kind == 'counter':
+            base = _prometheus_name(stage, name, 'total')
+            lines += [f"# TYPE {base} counter", f"{base}{{{labels}}} {total!r}"]
+        else:
+            base = _prometheus_name(stage, name)
+            lines += [
+                f"# TYPE {base} summary",
+                f"{base}_sum{{{labels}}} {total!r}",
+                f"{base}_count{{{labels}}} {count}",
+            ]
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write and rename so the collector never reads a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+
+def write_run_metrics(db_path, metrics):
+    import duckdb
+
+    if os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    con = duckdb.connect(db_path)
+    try:
+        con.execute('''
+            CREATE TABLE IF NOT EXISTS run_metrics (
+                run_id VARCHAR,
+                script VARCHAR,
+                stage VARCHAR,
+                metric VARCHAR,
+                kind VARCHAR,
+                count BIGINT,
+                total DOUBLE,
+                min DOUBLE,
+                max DOUBLE,
+                recorded_at TIMESTAMP
+            )
+        ''')
+        recorded_at = datetime.now()
+        # Totals are cumulative, so a later flush of the same run replaces the earlier one
+        con.execute("DELETE FROM run_metrics WHERE run_id = ?", [RUN_ID])
+        con.executemany(
+            "INSERT INTO run_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (RUN_ID, SCRIPT, stage, name, kind, count, total, minimum, maximum, recorded_at)
+                for (stage, name, kind), (count, total, minimum, maximum) in metrics.items()
+            ]
+        )
+    finally:
+        con.close()
+
+
+def flush(db_path=None, textfile_path=None, textfile_only=False):
+    """
+    Writes everything recorded so far. Called automatically at exit and on SIGTERM when
+    enabled; the periodic flush only refreshes the textfile.
+    """
+    metrics = snapshot()
+    if not metrics:
+        return
+    with _flush_lock:
+        try:
+            write_textfile(textfile_path or TEXTFILE_PATH, metrics)
+        except OSError as e:
+            print(f"Could not write metrics textfile: {e}")
+        if textfile_only:
+            return
+        try:
+            write_run_metrics(db_path or DB_PATH, metrics)
+        except Exception as e:
+            print(f"Could not write run_metrics: {e}")
+
+
+def _flush_periodically(interval):
+    while not _stop_event.wait(interval):
+        flush(textfile_only=True)
+
+
+def _handle_sigterm(signum, frame):
+    flush()
+    if callable(_previous_sigterm):
+        _previous_sigterm(signum, frame)
+    else:
+        raise SystemExit(128 + signum)
+
+
+_stop_event = threading.Event()
+_previous_sigterm = None
+
+
+def _start():
+    global _previous_sigterm
+    atexit.register(flush)
+    atexit.register(_stop_event.set)
+    if INTERVAL > 0:
+        threading.Thread(target=_flush_periodically, args=(INTERVAL,), name='metrics-flush', daemon=True).start()
+    try:
+        _previous_sigterm = signal.signal(signal.SIGTERM, _handle_sigterm)
+    except ValueError:
+        pass  # signal handlers can only be installed from the main thread
+
+
+if ENABLED:
+    _start()
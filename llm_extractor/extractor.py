@@ -4,19 +4,38 @@ from langfuse import Langfuse
 from langfuse.decorators import observe
 import re
 import time
+import threading
 from llm_extractor.llm_client import get_llm
+from llm_extractor.sharding import shard_of
 import duckdb
 from tqdm import tqdm
+import instrumentation
 
 class Extractor:
     langfuse = Langfuse()
+
+    # gse_metadata columns handed to process_study, in row order
+    SOURCE_COLUMNS = [
+        'series_id', 'title', 'summary', 'overall_design', 'organism', 'treatment',
+        'treatment_protocol', 'source', 'characteristics', 'molecule',
+        'extract_protocol', 'data_processing', 'library_strategy', 'library_source',
+        'authors_countries'
+    ]
     
-    def __init__(self, prompt_name, fields, model):
+    def __init__(self, prompt_name, fields, model, db_path='gse_metadata.db', source_db_path=None, shard=None):
         self.prompt_name = prompt_name
         self.fields = fields
         self.model = model
+        self.shard = shard  # (index, count) from sharding.parse_shard, or None for all series
         self.temp_folder = self.create_temp_folder()
-        self.db_connection = duckdb.connect('gse_metadata.db')
+        self.db_connection = duckdb.connect(db_path)
+        # Sharded runs read gse_metadata from a read-only snapshot and only write parse_results to db_path
+        if source_db_path:
+            self.source_connection = duckdb.connect(source_db_path, read_only=True)
+        else:
+            self.source_connection = self.db_connection
+        # process_study may be called from several threads (see run_pipeline.py)
+        self.db_lock = threading.Lock()
         self.setup_parse_results_table()
 
     def create_temp_folder(self):
@@ -37,6 +56,7 @@ class Extractor:
 
 
     @observe(as_type="generation")
+    @instrumentation.timed('extract', 'llm_call')
     def get_llm_response(self, msg):
         llm = get_llm(self.model)
         return llm.chat(msg)
@@ -62,6 +82,9 @@ class Extractor:
         
         return description.strip()
 
+    def row_from_metadata(self, metadata):
+        return tuple(metadata.get(column) for column in self.SOURCE_COLUMNS)
+
     def process_study(self, row):
         try:
             series_id = row[0]
@@ -72,7 +95,8 @@ class Extractor:
 
             text_description = self.create_text_description(row)
             
-            prompt = self.langfuse.get_prompt(self.prompt_name)
+            with instrumentation.timer('extract', 'get_prompt'):
+                prompt = self.langfuse.get_prompt(self.prompt_name)
             msg = prompt.compile(text=text_description)
             response = self.get_llm_response(msg)
             parsed_result = self.extract_info(response)
@@ -80,16 +104,17 @@ class Extractor:
             fields_placeholders = ', '.join(['?' for _ in self.fields])
             fields_names = ', '.join(self.fields)
             
-            self.db_connection.execute(f'''
+            with self.db_lock, instrumentation.timer('extract', 'db_insert'):
+                self.db_connection.execute(f'''
                 INSERT INTO parse_results (
                     series_id, prompt_name, extracted_text, 
                     {fields_names}
                 )
                 VALUES (?, ?, ?, {fields_placeholders})
-            ''', (
-                series_id, self.prompt_name, text_description,
-                *[parsed_result[field] for field in self.fields]
-            ))
+                ''', (
+                    series_id, self.prompt_name, text_description,
+                    *[parsed_result[field] for field in self.fields]
+                ))
             
             json_data = {
                 "series_id": series_id,
@@ -100,25 +125,33 @@ class Extractor:
             with open(json_filename, 'w') as json_file:
                 json.dump(json_data, json_file, indent=2)
             
+            instrumentation.incr('extract', 'studies')
             return parsed_result
         except TypeError:
+            instrumentation.incr('extract', 'errors')
             print(f"Error processing study {row[0]}. Skipping...")
             return None
 
 
-    def run_extraction(self):
-        query = """
-        SELECT 
-            series_id, title, summary, overall_design, organism, treatment,
-            treatment_protocol, source, characteristics, molecule,
-            extract_protocol, data_processing, library_strategy, library_source,
-            authors_countries
+    def run_extraction(self, limit=1000):
+        query = f"""
+        SELECT {', '.join(self.SOURCE_COLUMNS)}
         FROM gse_metadata
         WHERE organism LIKE '%Homo sapiens%'
-        LIMIT 1000
         """
-        
-        results = self.db_connection.execute(query).fetchall()
+        if self.shard is None:
+            if limit:
+                query += f"LIMIT {int(limit)}"
+            results = self.source_connection.execute(query).fetchall()
+        else:
+            # The shard is chosen by a stable hash of the series ID, so the limit applies per shard
+            index, count = self.shard
+            results = [
+                row for row in self.source_connection.execute(query + "ORDER BY series_id").fetchall()
+                if shard_of(row[0], count) == index
+            ]
+            if limit:
+                results = results[:limit]
         
         processed_count = 0
         error_count = 0
@@ -133,8 +166,10 @@ class Extractor:
         print(f"Total studies: {len(results)}, Skipped: {len(results) - processed_count - error_count}, Errors: {error_count}")
 
     def __del__(self):
+        if self.source_connection is not self.db_connection:
+            self.source_connection.close()
         self.db_connection.close()
 
 class GSEmetaExtractor(Extractor):
-    def __init__(self, model='groq'):
-        super().__init__('GSEmeta', ['high_level_indication', 'indication_detailed', 'drug_exposure', 'modalities','tissue_source', 'number_patients', 'sample_description', 'reasoning'], model)
\ No newline at end of file
+    def __init__(self, model='groq', **kwargs):
+        super().__init__('GSEmeta', ['high_level_indication', 'indication_detailed', 'drug_exposure', 'modalities','tissue_source', 'number_patients', 'sample_description', 'reasoning'], model, **kwargs)
\ No newline at end of file
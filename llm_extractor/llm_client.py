@@ -4,10 +4,14 @@ import time
 from dotenv import load_dotenv
 from openai import AzureOpenAI, RateLimitError
 import requests
+import instrumentation
 
 load_dotenv()
 
 class LLMClient:
+    MAX_RETRIES = 10
+    RETRY_DELAY = 30  # seconds before the first retry, doubled after each attempt
+
     @staticmethod
     def create(model='groq'):
         if model == "groq":
@@ -38,18 +42,21 @@ class LLMClient:
         self.base_url = base_url
 
     def chat(self, messages):
-        max_retries = 10
-        retry_delay = 30
+        max_retries = self.MAX_RETRIES
+        retry_delay = self.RETRY_DELAY
 
         for attempt in range(max_retries):
             try:
-                if self.client:
-                    return self._azure_chat(messages)
-                else:
-                    return self._groq_chat(messages)
+                with instrumentation.timer('extract', 'llm_request'):
+                    if self.client:
+                        return self._azure_chat(messages)
+                    else:
+                        return self._groq_chat(messages)
             except (RateLimitError, requests.exceptions.RequestException) as e:
                 if attempt < max_retries - 1:
                     print(f"API error. Attempt {attempt + 1}/{max_retries}. Waiting for {retry_delay} seconds before retrying...")
+                    instrumentation.incr('extract', 'llm_retries')
+                    instrumentation.incr('extract', 'llm_backoff_seconds', retry_delay)
                     time.sleep(retry_delay)
                     retry_delay *= 2  # Exponential backoff
                 else:
@@ -66,6 +73,8 @@ class LLMClient:
             model=self.model,
             messages=messages
         )
+        if response.usage:
+            self._record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
         return response.choices[0].message.content
 
     def _groq_chat(self, messages):
@@ -79,7 +88,15 @@ class LLMClient:
             "temperature": 0
         }
         response = requests.post(self.base_url, headers=headers, json=data)
-        return response.json()['choices'][0]['message']['content']
+        result = response.json()
+        usage = result.get('usage') or {}
+        self._record_usage(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+        return result['choices'][0]['message']['content']
+
+    @staticmethod
+    def _record_usage(prompt_tokens, completion_tokens):
+        instrumentation.observe('extract', 'prompt_tokens', prompt_tokens or 0)
+        instrumentation.observe('extract', 'completion_tokens', completion_tokens or 0)
 # def create_extraction_chain(prompt, llm):
 #     messages = [{"role": "user", "content": prompt}]
 #     response = llm.chat(messages)
@@ -0,0 +1,109 @@
+import os
+import zlib
+import duckdb
+
+# Helpers for spreading extraction over several machines. Every node reads the same
+# read-only snapshot of gse_metadata, processes the series that hash to its shard and
+# writes parse_results to its own file; merge_shards folds those files back into the
+# main database.
+
+
+def parse_shard(spec):
+    """
+    Parses a shard spec like '2/8' into (2, 8).
+    """
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected the form i/N (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', need 0 <= i < N")
+    return index, count
+
+
+def shard_of(series_id, count):
+    # crc32 instead of hash(): str hashes are salted per process and would differ between nodes
+    return zlib.crc32(series_id.encode('utf-8')) % count
+
+
+def default_shard_path(prompt_name, shard):
+    index, count = shard
+    return f'data/shards/parse_results_{prompt_name}_{index}_of_{count}.db'
+
+
+def create_snapshot(db_path, snapshot_path):
+    """
+    Copies gse_metadata into a standalone DuckDB file that extraction shards can open
+    read-only while the main database keeps receiving writes.
+    """
+    if os.path.dirname(snapshot_path):
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    con = duckdb.connect(snapshot_path)
+    try:
+        con.execute(f"ATTACH '{db_path}' AS source (READ_ONLY)")
+        con.execute("CREATE OR REPLACE TABLE gse_metadata AS SELECT * FROM source.gse_metadata")
+        count = con.execute("SELECT COUNT(*) FROM gse_metadata").fetchone()[0]
+        con.execute("DETACH source")
+    finally:
+        con.close()
+    print(f"Snapshot of {count} series written to {snapshot_path}")
+    return count
+
+
+def shard_source_sql(path):
+    """
+    Returns (table expression, attach statement, detach statement) for a shard file.
+    Shards are normally DuckDB files, but exported Parquet files are accepted as well.
+    """
+    if path.endswith('.parquet'):
+        return f"read_parquet('{path}')", None, None
+    alias = 'shard_' + str(zlib.crc32(path.encode('utf-8')))
+    return f"{alias}.parse_results", f"ATTACH '{path}' AS {alias} (READ_ONLY)", f"DETACH {alias}"
+
+
+def merge_shards(db_path, shard_paths):
+    """
+    Inserts the parse_results of every shard into the main database. Rows are unique
+    per (series_id, prompt_name): duplicates across shards are dropped and series that
+    are already in the main table are kept as they are. Returns the number of new rows.
+    """
+    shard_paths = list(dict.fromkeys(shard_paths))
+    con = duckdb.connect(db_path)
+    sources = []
+    try:
+        for path in shard_paths:
+            table, attach, detach = shard_source_sql(path)
+            if attach:
+                con.execute(attach)
+            sources.append((table, detach))
+
+        if not sources:
+            print("No shard files given.")
+            return 0
+
+        # New databases get the table layout of the first shard
+        con.execute(f"CREATE TABLE IF NOT EXISTS parse_results AS SELECT * FROM {sources[0][0]} LIMIT 0")
+        columns = ', '.join(info[0] for info in con.execute("DESCRIBE parse_results").fetchall())
+
+        union = ' UNION ALL '.join(f"SELECT {columns} FROM {table}" for table, _ in sources)
+        before = con.execute("SELECT COUNT(*) FROM parse_results").fetchone()[0]
+        con.execute(f'''
+            INSERT INTO parse_results ({columns})
+            SELECT {columns} FROM ({union}) AS shards
+            WHERE NOT EXISTS (
+                SELECT 1 FROM parse_results existing
+                WHERE existing.series_id = shards.series_id
+                  AND existing.prompt_name = shards.prompt_name
+            )
+            QUALIFY row_number() OVER (PARTITION BY series_id, prompt_name ORDER BY series_id) = 1
+        ''')
+        inserted = con.execute("SELECT COUNT(*) FROM parse_results").fetchone()[0] - before
+
+        for _, detach in sources:
+            if detach:
+                con.execute(detach)
+    finally:
+        con.close()
+
+    print(f"Merged {len(shard_paths)} shard(s) into {db_path}: {inserted} new rows")
+    return inserted
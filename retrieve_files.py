@@ -1,20 +1,91 @@
-from create_vectorstore import VectorStore
+import argparse
 
-if __name__ == "__main__":
-    vector_store = VectorStore()
-    index_name = "gse-index"
+# Heavy dependencies (pinecone, openai, pandas) are only imported once a semantic
+# query actually needs them, so --help and lexical queries start almost instantly.
+
+LEXICAL_COLUMNS = ['title', 'summary', 'overall_design']
+
+
+def lexical_search(conn, query, top_k=10):
+    """
+    Returns gse_metadata rows whose title, summary or overall design contain every
+    term of the query (case-insensitive).
+    """
+    terms = [term for term in query.split() if term]
+    if not terms:
+        return []
+
+    searchable = " || ' ' || ".join(f"coalesce({column}, '')" for column in LEXICAL_COLUMNS)
+    conditions = ' AND '.join([f"({searchable}) ILIKE ?" for _ in terms])
+    cursor = conn.execute(f'''
+        SELECT * FROM gse_metadata
+        WHERE {conditions}
+        LIMIT ?
+    ''', [*[f'%{term}%' for term in terms], top_k])
+    columns = [desc[0] for desc in cursor.description]
+    return [
+        {column: value for column, value in zip(columns, row) if value}
+        for row in cursor.fetchall()
+    ]
+
+
+def lexical_search_db(db_path, query, top_k=10):
+    """
+    Runs lexical_search on a connection opened only for this query. DuckDB lets a single
+    process hold a file open for writing, so keeping a connection around would block the
+    scripts that update gse_metadata.
+    """
+    import duckdb
+
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        return lexical_search(conn, query, top_k)
+    finally:
+        conn.close()
+
+
+def print_results(results, top_k):
+    if results:
+        print(f"Top {top_k} Matches:")
+        for idx, result in enumerate(results, 1):
+            print(f"\nResult {idx}:")
+            for key, value in result.items():
+                print(f"{key}: {value}")
+    else:
+        print("No matches found.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Search the GEO series metadata.")
+    parser.add_argument('query', nargs='?', help="Run a single query and exit instead of starting the prompt")
+    parser.add_argument('--lexical', action='store_true', help="Keyword search in the local DuckDB database instead of the vector index")
+    parser.add_argument('--db', default='gse_metadata.db', help="DuckDB database used for lexical search")
+    parser.add_argument('--index', default='gse-index', help="Pinecone index used for semantic search")
+    parser.add_argument('--top-k', type=int, default=10, help="Number of results to return")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.lexical:
+        search = lambda query: lexical_search_db(args.db, query, args.top_k)
+    else:
+        from create_vectorstore import VectorStore
+        vector_store = VectorStore()
+        search = lambda query: vector_store.retrieve(args.index, query, args.top_k)
+
+    if args.query:
+        print_results(search(args.query), args.top_k)
+        return
 
     while True:
         query = input("Enter your question (or type 'exit' to quit): ")
         if query.lower() == 'exit':
             break
 
-        results = vector_store.retrieve(index_name, query)
-        if results:
-            print("Top 10 Matches:")
-            for idx, result in enumerate(results, 1):
-                print(f"\nResult {idx}:")
-                for key, value in result.items():
-                    print(f"{key}: {value}")
-        else:
-            print("No matches found.")
+        print_results(search(query), args.top_k)
+
+
+if __name__ == "__main__":
+    main()
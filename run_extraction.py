@@ -1,13 +1,75 @@
-from llm_extractor.extractor import GSEmetaExtractor
+import argparse
+import os
+from llm_extractor.sharding import parse_shard, default_shard_path, create_snapshot, merge_shards
+
+# Single machine:   python run_extraction.py
+# Several machines: python run_extraction.py snapshot --output snapshot.db
+#                   python run_extraction.py --shard 0/4 --source snapshot.db   (one per node)
+#                   python run_extraction.py merge data/shards/*.db
+
+SNAPSHOT_PATH = 'data/shards/gse_metadata_snapshot.db'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run LLM extraction over the GEO metadata.")
+    parser.add_argument('--model', default='gpt-4o')
+    parser.add_argument('--limit', type=int, default=1000, help="Maximum number of studies (per shard); 0 for no limit")
+    parser.add_argument('--shard', help="Only process shard i of N (by hash of series ID), e.g. 0/4")
+    parser.add_argument('--source', help=f"Read-only gse_metadata snapshot to read from (see 'snapshot'; default with --shard: {SNAPSHOT_PATH})")
+    parser.add_argument('--output', help="Database that receives parse_results (default: gse_metadata.db, or a per-shard file with --shard)")
+
+    subparsers = parser.add_subparsers(dest='command')
+    snapshot_parser = subparsers.add_parser('snapshot', help="Write a read-only copy of gse_metadata for shards")
+    snapshot_parser.add_argument('--db', default='gse_metadata.db')
+    snapshot_parser.add_argument('--output', dest='snapshot_output', default=SNAPSHOT_PATH)
+
+    merge_parser = subparsers.add_parser('merge', help="Fold shard parse_results back into the main database")
+    merge_parser.add_argument('shards', nargs='+', help="Shard DuckDB (.db) or Parquet (.parquet) files")
+    merge_parser.add_argument('--db', default='gse_metadata.db')
+    return parser.parse_args()
+
 
 def main():
+    args = parse_args()
+
+    if args.command == 'snapshot':
+        create_snapshot(args.db, args.snapshot_output)
+        return
+
+    if args.command == 'merge':
+        merge_shards(args.db, args.shards)
+        return
+
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    # Shards never read from their own output database, which has no gse_metadata table
+    source = args.source
+    if shard and source is None:
+        source = SNAPSHOT_PATH
+    if source is not None and not os.path.exists(source):
+        raise SystemExit(f"Source database {source} not found; create it with 'python run_extraction.py snapshot' "
+                         f"and copy it to this machine, or pass --source")
+
+    from llm_extractor.extractor import GSEmetaExtractor
+
+    output = args.output
+    if output is None:
+        output = default_shard_path('GSEmeta', shard) if shard else 'gse_metadata.db'
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
     # Initialize the GSEmetaExtractor
-    extractor = GSEmetaExtractor(model='gpt-4o')
+    extractor = GSEmetaExtractor(model=args.model, db_path=output, source_db_path=source, shard=shard)
 
     # Run the extraction process
-    extractor.run_extraction()
+    extractor.run_extraction(limit=args.limit)
 
     print("Extraction process completed.")
+    if shard:
+        print(f"Shard {args.shard} results written to {output}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,365 @@
+import argparse
+import ftplib
+import glob
+import os
+import queue
+import threading
+import time
+import duckdb
+import instrumentation
+from create_meta_db import create_metadata_table, extract_metadata, upsert_metadata
+from get_meta_gse_mostrecent import connect_ftp, get_most_recent_folders, list_subfolders, download_and_extract_miniml
+
+# Streams series from the GEO FTP server into the search index without waiting for
+# each batch script to finish:
+#
+#   list -> download -> parse -> upsert -> extract -> embed
+#
+# Stages are connected by bounded queues, so a slow stage blocks the ones feeding it
+# instead of letting work pile up in memory. Every stage records finished items in
+# the pipeline_checkpoints table; after a restart items flow through again but each
+# stage skips the work it has already done.
+
+FTP_URL = "ftp.ncbi.nlm.nih.gov"
+DB_PATH = 'gse_metadata.db'
+STOP = object()
+
+
+class IncompleteUpsert(Exception):
+    pass
+
+
+# Failures worth retrying; anything else (e.g. a malformed XML file) cannot succeed on
+# a second attempt and is counted as an error straight away
+TRANSIENT_ERRORS = (OSError, EOFError, ftplib.error_temp, duckdb.IOException, duckdb.TransactionException)
+
+
+class Checkpoints:
+    def __init__(self, db_path):
+        self.conn = duckdb.connect(db_path)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS pipeline_checkpoints (
+                stage VARCHAR,
+                item_id VARCHAR,
+                completed_at TIMESTAMP
+            )
+        ''')
+        self.lock = threading.Lock()
+        self.done_items = set(self.conn.execute("SELECT stage, item_id FROM pipeline_checkpoints").fetchall())
+
+    def done(self, stage, item_id):
+        return (stage, item_id) in self.done_items
+
+    def mark(self, stage, item_ids):
+        with self.lock:
+            new_ids = [item_id for item_id in item_ids if (stage, item_id) not in self.done_items]
+            if not new_ids:
+                return
+            self.conn.executemany(
+                "INSERT INTO pipeline_checkpoints VALUES (?, ?, current_timestamp)",
+                [(stage, item_id) for item_id in new_ids]
+            )
+            self.done_items.update((stage, item_id) for item_id in new_ids)
+
+
+class Stage:
+    """
+    A pool of worker threads that takes items from input_queue, applies func and puts
+    every returned item on output_queue. If batch_size is set, func receives a list of
+    up to batch_size items that were available at the same time. An item failing with
+    one of the retry_on exceptions is tried max_attempts times, waiting retry_wait
+    seconds (doubled each time) in between.
+    """
+    def __init__(self, name, func, workers, input_queue, output_queue=None, batch_size=None,
+                 max_attempts=3, retry_wait=5, retry_on=TRANSIENT_ERRORS):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_on = retry_on
+        self.retry_wait = retry_wait
+        self.processed = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.work, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def next_batch(self):
+        item = self.input_queue.get()
+        if item is STOP:
+            return None, True
+        batch = [item]
+        while len(batch) < (self.batch_size or 1):
+            try:
+                item = self.input_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def process(self, batch):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with instrumentation.timer(self.name, 'item'):
+                    return self.func(batch if self.batch_size else batch[0])
+            except self.retry_on as e:
+                if attempt == self.max_attempts:
+                    raise
+                wait_time = self.retry_wait * (2 ** (attempt - 1))
+                print(f"[{self.name}] Attempt {attempt} failed for {len(batch)} item(s): {e}; retrying in {wait_time} seconds")
+                instrumentation.incr(self.name, 'retries')
+                instrumentation.incr(self.name, 'backoff_seconds', wait_time)
+                time.sleep(wait_time)
+
+    def work(self):
+        stopped = False
+        while not stopped:
+            batch, stopped = self.next_batch()
+            if not batch:
+                continue
+            try:
+                outputs = self.process(batch)
+                with self.lock:
+                    self.processed += len(batch)
+            except Exception as e:
+                print(f"[{self.name}] Error processing {len(batch)} item(s): {e}")
+                instrumentation.incr(self.name, 'errors', len(batch))
+                with self.lock:
+                    self.errors += len(batch)
+                continue
+            if self.output_queue is not None:
+                # Time spent blocked on a full queue means the next stage is the bottleneck
+                with instrumentation.timer(self.name, 'output_wait'):
+                    for output in outputs or []:
+                        self.output_queue.put(output)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+class Pipeline:
+    def __init__(self, workers, queue_size=100, embed_batch_size=64, local=False,
+                 max_folders=None, extract=True, embed=True, model='gpt-4o', index_name='gse-index',
+                 max_attempts=3, retry_wait=5):
+        self.local = local
+        self.max_folders = max_folders
+        self.index_name = index_name
+
+        self.db_connection = duckdb.connect(DB_PATH)
+        self.db_lock = threading.Lock()
+        create_metadata_table(self.db_connection)
+        self.checkpoints = Checkpoints(DB_PATH)
+
+        self.extractor = None
+        if extract:
+            from llm_extractor.extractor import GSEmetaExtractor
+            self.extractor = GSEmetaExtractor(model=model)
+
+        self.vector_store = None
+        if embed:
+            from create_vectorstore import VectorStore
+            self.vector_store = VectorStore()
+            self.vector_store.ensure_index(index_name)
+
+        stage_funcs = [
+            ('download', self.download, None),
+            ('parse', self.parse, None),
+            ('upsert', self.upsert, None),
+        ]
+        if extract:
+            stage_funcs.append(('extract', self.extract, None))
+        if embed:
+            stage_funcs.append(('embed', self.embed, embed_batch_size))
+        # Stages after parse whose checkpoints decide whether a series still needs work
+        self.tracked_stages = [name for name, _, _ in stage_funcs[2:]]
+        # Parsing a local file fails the same way every time; a short embed batch is
+        # usually a rate limit or an outage on the provider's side
+        retry_on = {'parse': (), 'embed': TRANSIENT_ERRORS + (IncompleteUpsert,)}
+
+        self.source_queue = queue.Queue(maxsize=queue_size)
+        self.stages = []
+        input_queue = self.source_queue
+        for i, (name, func, batch_size) in enumerate(stage_funcs):
+            is_last = i == len(stage_funcs) - 1
+            output_queue = None if is_last else queue.Queue(maxsize=queue_size)
+            self.stages.append(Stage(name, func, workers.get(name, 1), input_queue, output_queue, batch_size,
+                                     max_attempts=max_attempts, retry_wait=retry_wait,
+                                     retry_on=retry_on.get(name, TRANSIENT_ERRORS)))
+            input_queue = output_queue
+
+    # --- stage functions -------------------------------------------------------
+
+    def download(self, item):
+        if self.local:
+            return [item]  # already an XML path on disk
+        main_folder, subfolder = item
+        if self.checkpoints.done('download', subfolder):
+            return glob.glob(os.path.join(f"data/GSE_meta/{main_folder}", f"{subfolder}_*.xml"))
+        xml_paths = download_and_extract_miniml(FTP_URL, main_folder, subfolder)
+        if xml_paths:
+            self.checkpoints.mark('download', [subfolder])
+        return xml_paths
+
+    def parse(self, xml_path):
+        metadata = extract_metadata(xml_path)
+        series_id = metadata['series_id']
+        if not series_id:
+            return []
+        if all(self.checkpoints.done(stage, series_id) for stage in self.tracked_stages):
+            return []
+        return [metadata]
+
+    def upsert(self, metadata):
+        series_id = metadata['series_id']
+        if not self.checkpoints.done('upsert', series_id):
+            with self.db_lock:
+                upsert_metadata(self.db_connection, metadata)
+            self.checkpoints.mark('upsert', [series_id])
+        return [metadata]
+
+    def extract(self, metadata):
+        series_id = metadata['series_id']
+        if self.checkpoints.done('extract', series_id):
+            return [metadata]
+        # Same selection as Extractor.run_extraction
+        if 'Homo sapiens' in (metadata['organism'] or ''):
+            try:
+                self.extractor.process_study(self.extractor.row_from_metadata(metadata))
+            except Exception as e:
+                # The series is still embedded; extraction is retried on the next run
+                print(f"[extract] Extraction failed for {series_id}: {e}")
+                instrumentation.incr('extract', 'errors')
+                return [metadata]
+            if not os.path.exists(os.path.join(self.extractor.temp_folder, f"{series_id}.json")):
+                print(f"[extract] No result for {series_id}; it will be retried on the next run")
+                return [metadata]
+        self.checkpoints.mark('extract', [series_id])
+        return [metadata]
+
+    def embed(self, batch):
+        records = [
+            self.vector_store.prepare_record(metadata)
+            for metadata in batch
+            if not self.checkpoints.done('embed', metadata['series_id'])
+        ]
+        written = self.vector_store.upsert_records(self.index_name, records)
+        if written != len(records):
+            # Raise so the stage retries the batch and counts it as an error if it keeps failing
+            raise IncompleteUpsert(f"{written} of {len(records)} records embedded and upserted")
+        self.checkpoints.mark('embed', [record['id'] for record in records])
+        return []
+
+    # --- driver ----------------------------------------------------------------
+
+    def feed(self):
+        if self.local:
+            for root, dirs, files in os.walk('data/GSE_meta'):
+                for filename in files:
+                    if filename.endswith('.xml'):
+                        self.source_queue.put(os.path.join(root, filename))
+            return
+
+        ftp = connect_ftp(FTP_URL)
+        try:
+            folders = get_most_recent_folders(ftp)
+        finally:
+            ftp.quit()
+        if self.max_folders is not None:
+            folders = folders[:self.max_folders]
+
+        for folder in folders:
+            for subfolder in list_subfolders(FTP_URL, folder):
+                self.source_queue.put((folder, subfolder))
+
+    def report(self, stop_event, interval):
+        while not stop_event.wait(interval):
+            print(' | '.join(
+                f"{stage.name}: {stage.processed} done, {stage.input_queue.qsize()} queued"
+                for stage in self.stages
+            ))
+
+    def run(self, status_interval=30):
+        start = time.time()
+        for stage in self.stages:
+            stage.start()
+
+        stop_event = threading.Event()
+        reporter = threading.Thread(target=self.report, args=(stop_event, status_interval), daemon=True)
+        reporter.start()
+
+        source = threading.Thread(target=self.feed, name="source", daemon=True)
+        source.start()
+        source.join()
+
+        # Shut down front to back: once a stage has drained, its successor gets one
+        # STOP per worker after everything the stage produced
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                stage.input_queue.put(STOP)
+            stage.join()
+        stop_event.set()
+
+        print(f"Pipeline finished in {time.time() - start:.1f} seconds")
+        for stage in self.stages:
+            print(f"  {stage.name}: {stage.processed} processed, {stage.errors} errors")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stream GEO series from download to search index.")
+    parser.add_argument('--download-workers', type=int, default=4)
+    parser.add_argument('--parse-workers', type=int, default=2)
+    parser.add_argument('--upsert-workers', type=int, default=1, help="DuckDB has a single writer; more workers only help when other stages are idle")
+    parser.add_argument('--extract-workers', type=int, default=4)
+    parser.add_argument('--embed-workers', type=int, default=2)
+    parser.add_argument('--embed-batch-size', type=int, default=64, help="Records per embedding request")
+    parser.add_argument('--queue-size', type=int, default=100, help="Capacity of each queue between stages")
+    parser.add_argument('--max-folders', type=int, help="Only process the N most recent GSEnnn folders")
+    parser.add_argument('--local', action='store_true', help="Read XML files already in data/GSE_meta instead of downloading")
+    parser.add_argument('--no-extract', action='store_true', help="Skip the LLM extraction stage")
+    parser.add_argument('--no-embed', action='store_true', help="Skip the embedding stage")
+    parser.add_argument('--model', default='gpt-4o', help="Model used by the extraction stage")
+    parser.add_argument('--index', default='gse-index', help="Pinecone index the embedding stage writes to")
+    parser.add_argument('--status-interval', type=float, default=30, help="Seconds between progress lines")
+    parser.add_argument('--max-attempts', type=int, default=3, help="Tries per item before a stage counts it as an error")
+    parser.add_argument('--retry-wait', type=float, default=5, help="Seconds before retrying a failed item, doubled after each attempt")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workers = {
+        'download': args.download_workers,
+        'parse': args.parse_workers,
+        'upsert': args.upsert_workers,
+        'extract': args.extract_workers,
+        'embed': args.embed_workers,
+    }
+    pipeline = Pipeline(
+        workers,
+        queue_size=args.queue_size,
+        embed_batch_size=args.embed_batch_size,
+        local=args.local,
+        max_folders=args.max_folders,
+        extract=not args.no_extract,
+        embed=not args.no_embed,
+        model=args.model,
+        index_name=args.index,
+        max_attempts=max(1, args.max_attempts),
+        retry_wait=args.retry_wait,
+    )
+    pipeline.run(status_interval=args.status_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from retrieve_files import lexical_search_db
+
+# Small HTTP/JSON front end for VectorStore. Clients are created once at startup and
+# kept warm; blocking Pinecone/OpenAI/DuckDB calls run on a thread pool so several
+# queries can be in flight at the same time.
+#
+#   GET  /search?q=...&top_k=10&mode=semantic|lexical
+#   POST /search        {"query": "...", "top_k": 10, "mode": "semantic"}
+#                       {"queries": ["...", "..."], "top_k": 10}
+#   GET  /stats         request counts and latency percentiles per endpoint
+#   GET  /health
+
+MAX_BODY_SIZE = 1024 * 1024
+MAX_TOP_K = 100
+MAX_BATCH_QUERIES = 1000
+SEARCH_MODES = ('semantic', 'lexical')
+ENDPOINTS = ('/search', '/stats', '/health')
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class LatencyTracker:
+    """
+    Keeps the most recent latencies per endpoint and reports percentiles over them.
+    """
+    def __init__(self, window=10000):
+        self.window = window
+        self._latencies = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+    @staticmethod
+    def percentile(sorted_values, pct):
+        if not sorted_values:
+            return None
+        rank = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+        return sorted_values[rank]
+
+    def summary(self):
+        with self._lock:
+            snapshot = {endpoint: sorted(values) for endpoint, values in self._latencies.items()}
+            counts = dict(self._counts)
+        return {
+            endpoint: {
+                'count': counts[endpoint],
+                **{f'p{pct}_ms': round(self.percentile(values, pct) * 1000, 2) for pct in (50, 90, 99)},
+                'max_ms': round(values[-1] * 1000, 2),
+            }
+            for endpoint, values in snapshot.items()
+        }
+
+
+class SearchService:
+    def __init__(self, index_name='gse-index', db_path='gse_metadata.db', workers=16, semantic=True,
+                 max_retries=2, retry_wait=0.5):
+        self.index_name = index_name
+        # Lexical queries open the database read-only per request; holding it open would
+        # stop create_meta_db.py, run_pipeline.py and run_extraction.py from writing to it
+        self.db_path = db_path
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.latencies = LatencyTracker()
+        self.started_at = time.time()
+
+        self.vector_store = None
+        if semantic:
+            from create_vectorstore import VectorStore
+            self.vector_store = VectorStore(max_retries=max_retries, base_wait_time=retry_wait, raise_on_failure=True)
+            # Warm the index handle so the first request does not pay for it
+            self.vector_store.get_index(index_name)
+
+    def lexical(self, query, top_k):
+        import duckdb
+
+        if not self.db_path:
+            raise ValueError("lexical search needs a database (--db)")
+        try:
+            return lexical_search_db(self.db_path, query, top_k)
+        except (duckdb.IOException, duckdb.CatalogException) as e:
+            # Missing database, or a writer currently holds the file lock
+            raise ServiceUnavailable(f"database unavailable: {e}") from e
+
+    def semantic(self, method, *args):
+        from create_vectorstore import RetrievalError
+
+        if self.vector_store is None:
+            raise ValueError("semantic search is disabled (--no-semantic)")
+        try:
+            return getattr(self.vector_store, method)(self.index_name, *args)
+        except RetrievalError as e:
+            raise ServiceUnavailable(str(e)) from e
+
+    def search(self, query, top_k=10, mode='semantic'):
+        if mode == 'lexical':
+            return self.lexical(query, top_k)
+        return self.semantic('retrieve', query, top_k)
+
+    def search_many(self, queries, top_k=10, mode='semantic'):
+        if mode == 'lexical':
+            return [self.lexical(query, top_k) for query in queries]
+        return self.semantic('retrieve_many', queries, top_k)
+
+    async def handle_request(self, method, path, body):
+        url = urlsplit(path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        loop = asyncio.get_running_loop()
+
+        if url.path == '/health':
+            return 200, {'status': 'ok'}
+
+        if url.path == '/stats':
+            return 200, {
+                'uptime_s': round(time.time() - self.started_at, 1),
+                'endpoints': self.latencies.summary(),
+            }
+
+        if url.path == '/search':
+            if method == 'POST':
+                try:
+                    payload = json.loads(body or b'{}')
+                except ValueError:
+                    return 400, {'error': 'request body is not valid JSON'}
+                if not isinstance(payload, dict):
+                    return 400, {'error': 'request body must be a JSON object'}
+                params.update(payload)
+            elif method != 'GET':
+                return 405, {'error': f'method {method} not allowed'}
+
+            top_k = params.get('top_k', 10)
+            if isinstance(top_k, bool):
+                return 400, {'error': 'top_k must be an integer'}
+            try:
+                top_k = int(top_k)
+            except (TypeError, ValueError):
+                return 400, {'error': 'top_k must be an integer'}
+            if not 1 <= top_k <= MAX_TOP_K:
+                return 400, {'error': f'top_k must be between 1 and {MAX_TOP_K}'}
+            mode = params.get('mode', 'semantic')
+            if mode not in SEARCH_MODES:
+                return 400, {'error': f"mode must be one of {', '.join(SEARCH_MODES)}"}
+
+            if 'queries' in params:
+                queries = params['queries']
+                if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+                    return 400, {'error': 'queries must be a list of strings'}
+                if len(queries) > MAX_BATCH_QUERIES:
+                    return 400, {'error': f'at most {MAX_BATCH_QUERIES} queries per request'}
+                results = await loop.run_in_executor(self.executor, self.search_many, queries, top_k, mode)
+                return 200, {'results': [{'query': q, 'matches': r} for q, r in zip(queries, results)]}
+
+            query = params.get('q', params.get('query'))
+            if not query or not isinstance(query, str):
+                return 400, {'error': 'missing query (q)'}
+            matches = await loop.run_in_executor(self.executor, self.search, query, top_k, mode)
+            return 200, {'query': query, 'matches': matches}
+
+        return 404, {'error': f'unknown endpoint {url.path}'}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                    if not request_line:
+                        break
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        name, _, value = line.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                except ValueError:
+                    # Request line or header longer than the stream limit (64 KiB)
+                    await self.send(writer, 400, {'error': 'request line or header too long'}, keep_alive=False)
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.send(writer, 400, {'error': 'malformed request line'}, keep_alive=False)
+                    break
+
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.send(writer, 400, {'error': 'invalid Content-Length'}, keep_alive=False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.send(writer, 413, {'error': 'request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                keep_alive = (
+                    headers.get('connection', '').lower() != 'close'
+                    and (version != 'HTTP/1.0' or headers.get('connection', '').lower() == 'keep-alive')
+                )
+
+                start = time.perf_counter()
+                try:
+                    status, payload = await self.handle_request(method, path, body)
+                except ValueError as e:
+                    status, payload = 400, {'error': str(e)}
+                except ServiceUnavailable as e:
+                    status, payload = 503, {'error': str(e)}
+                except Exception as e:
+                    print(f"Error handling {method} {path}: {e}")
+                    status, payload = 500, {'error': 'internal error'}
+                # Unknown paths share one entry so probing cannot grow /stats without bound
+                endpoint = urlsplit(path).path
+                self.latencies.record(endpoint if endpoint in ENDPOINTS else 'other', time.perf_counter() - start)
+
+                await self.send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def send(writer, status, payload, keep_alive):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                   413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+        body = json.dumps(payload, default=str).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Search service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve GEO metadata search over HTTP/JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--index', default='gse-index', help="Pinecone index used for semantic search")
+    parser.add_argument('--db', default='gse_metadata.db', help="DuckDB database used for lexical search")
+    parser.add_argument('--workers', type=int, default=16, help="Threads for concurrent index and database queries")
+    parser.add_argument('--no-semantic', action='store_true', help="Only serve lexical search (no Pinecone/OpenAI clients)")
+    parser.add_argument('--retries', type=int, default=2, help="Attempts per semantic query before answering 503")
+    parser.add_argument('--retry-wait', type=float, default=0.5, help="Seconds before the first retry, doubled after each attempt")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    service = SearchService(
+        index_name=args.index,
+        db_path=args.db,
+        workers=args.workers,
+        semantic=not args.no_semantic,
+        max_retries=max(1, args.retries),
+        retry_wait=args.retry_wait,
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()